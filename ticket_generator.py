@@ -1,8 +1,15 @@
 from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.pdfgen import canvas
-from reportlab.lib.colors import lightgrey
+from reportlab.lib.colors import HexColor, lightgrey
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import ImageReader
+import reportlab
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import sys
 import os
 import math
@@ -11,101 +18,262 @@ import io
 
 # Constants
 FONT_SIZE = 32
+FONT_FILES = ["arialbd.ttf", "arial.ttf"]
+FALLBACK_FONT = os.path.join(os.path.dirname(reportlab.__file__), "fonts", "VeraBd.ttf")
 MARGIN = 20
 SPACING = 10
 BORDER_COLOR = lightgrey
 TEXT_COLOR = "#002f79"
 TEXT_PADDING = 50  # Distance from edges for numbers
+NUMBER_PREFIX = "NO: "
+NUMBER_DIGITS = 6
+# Length of the vertical number line, in both the PDF and image layouts
+NUMBER_COLUMN_HEIGHT = FONT_SIZE * (len(NUMBER_PREFIX) + NUMBER_DIGITS)
+JPEG_QUALITY = 85  # The template is embedded in the PDF as JPEG
+TICKET_PNG_COLORS = 64  # Palette size for individual ticket images
+RENDER_CHUNKSIZE = 16  # Tickets handed to a worker process at a time
+
+
+def blend_overlay(dst, overlay, x, y):
+    """Alpha-blend an RGBA overlay array onto an RGBA array in place at (x, y)"""
+    h, w = overlay.shape[:2]
+    region = dst[y : y + h, x : x + w, :3]
+    alpha = overlay[..., 3:].astype(np.uint16)
+    blended = overlay[..., :3] * alpha + region * (255 - alpha) + 127
+    region[...] = blended // 255
+
+
+def pack_rgb(rgb):
+    """Pack an array of RGB(A) pixels into one uint32 per pixel"""
+    return (
+        rgb[..., 0].astype(np.uint32) << 16
+        | rgb[..., 1].astype(np.uint32) << 8
+        | rgb[..., 2].astype(np.uint32)
+    )
+
+
+def palette_indices(rgb, colors):
+    """Map an array of RGB(A) pixels to the indices of their nearest colors"""
+    # Each distinct colour is looked up once; the flat design has few of them
+    packed, inverse = np.unique(pack_rgb(rgb), return_inverse=True)
+    unique = np.stack([packed >> 16, packed >> 8, packed], axis=-1) & 0xFF
+    distance = np.square(
+        unique[:, None, :].astype(np.int32) - colors.astype(np.int32)
+    ).sum(axis=-1)
+    return distance.argmin(axis=-1).astype(np.uint8)[inverse].reshape(rgb.shape[:-1])
+
+
+def encode_jpeg(img):
+    """Encode a PIL image as JPEG bytes for embedding in the PDF"""
+    img_buffer = io.BytesIO()
+    img.convert("RGB").save(img_buffer, format="JPEG", quality=JPEG_QUALITY)
+    return img_buffer.getvalue()
 
 
 class TicketGenerator:
     def __init__(self, template_path):
         self.template_path = template_path
-        self.vertical_font = self._load_font()
-
-    def _load_font(self):
-        """Load font with fallbacks"""
-        try:
-            return ImageFont.truetype("arialbd.ttf", FONT_SIZE)
-        except:
+        # Decoded once; every ticket starts from a copy of this
+        self.template = Image.open(template_path).convert("RGBA")
+        self.font_path = self._find_font()
+        self.vertical_font = ImageFont.truetype(self.font_path, FONT_SIZE)
+        self._glyphs = {}  # (text, color) -> pre-rendered RGBA tile array
+        self._scratch_buffers = {}  # Working arrays reused across tickets
+        self._base = None  # Base array of the template, built on first use
+        self._palette_base = None  # Base array the cached PNG palette was built from
+        self._palette = None
+        self._get_glyph(NUMBER_PREFIX, TEXT_COLOR)
+        self._digit_glyphs = [self._get_glyph(str(d), TEXT_COLOR) for d in range(10)]
+
+    def _find_font(self):
+        """Return the path of the first font in FONT_FILES that PIL finds,
+        falling back to FALLBACK_FONT.
+
+        The PDF embeds the same file, so both outputs use the same font.
+        """
+        for font_file in FONT_FILES:
             try:
-                return ImageFont.truetype("arial.ttf", FONT_SIZE)
-            except:
-                return ImageFont.load_default()
-
-    def _create_vertical_text(self, text, img_height, img_width, color):
-        # Create an image with height based on text length
-        text_width = FONT_SIZE * len(text)
-        txt_img = Image.new("RGBA", (text_width, FONT_SIZE), (255, 255, 255, 0))
-        txt_draw = ImageDraw.Draw(txt_img)
-
-        # Draw text horizontally
-        txt_draw.text((0, 0), text, fill=color, font=self.vertical_font)
-
-        # Rotate counter-clockwise for left side, clockwise for right side
-        rotated = txt_img.rotate(90, expand=True)
-
-        return rotated
+                # PIL searches the system font folders, subfolders included
+                return os.path.abspath(ImageFont.truetype(font_file, FONT_SIZE).path)
+            except OSError:
+                continue
+        return FALLBACK_FONT
+
+    def _get_glyph(self, text, color):
+        """Return a cached RGBA tile array for text, already rotated to read
+        bottom to top, as tall as its advance"""
+        key = (text, color)
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            width = math.ceil(self.vertical_font.getlength(text))
+            tile = Image.new("RGBA", (width, FONT_SIZE), (255, 255, 255, 0))
+            ImageDraw.Draw(tile).text((0, 0), text, fill=color, font=self.vertical_font)
+            tile = tile.transpose(Image.Transpose.ROTATE_90)
+            glyph = self._glyphs[key] = np.array(tile)
+        return glyph
+
+    def _scratch(self, key, shape):
+        """Return a reusable uint8 working array of the given shape"""
+        buffer = self._scratch_buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._scratch_buffers[key] = np.empty(shape, np.uint8)
+        return buffer
+
+    def _create_vertical_text(self, text, color):
+        """Return text as a vertical RGBA array, valid until the next call"""
+        # Stack the pre-rotated prefix and digit tiles, first character at the bottom
+        pieces = list(text)
+        if text.startswith(NUMBER_PREFIX):
+            pieces[: len(NUMBER_PREFIX)] = [NUMBER_PREFIX]
+        glyphs = [self._get_glyph(piece, color) for piece in reversed(pieces)]
+
+        return self._stack_glyphs(glyphs)
+
+    def _create_vertical_number(self, ticket_number):
+        """Return the zero-padded ticket number as a vertical RGBA array,
+        valid until the next call"""
+        # Digits come off least significant first, which is the top of the strip
+        glyphs = []
+        while ticket_number or len(glyphs) < NUMBER_DIGITS:
+            ticket_number, digit = divmod(ticket_number, 10)
+            glyphs.append(self._digit_glyphs[digit])
+
+        return self._stack_glyphs(glyphs)
+
+    def _stack_glyphs(self, glyphs):
+        """Stack glyph tiles top to bottom into the reusable text array"""
+        text_height = sum(glyph.shape[0] for glyph in glyphs)
+        txt = self._scratch("text", (text_height, FONT_SIZE, 4))
+        np.concatenate(glyphs, axis=0, out=txt)
+        return txt
 
     def add_numbers_to_ticket(self, ticket_number, output_folder):
-        img = Image.open(self.template_path)
+        if self._base is None:
+            self._base = self.create_base_template(self.template)
+        patches = self.add_numbers_to_patches(ticket_number, self._base)
+        return self.save_ticket(ticket_number, self._base, patches, output_folder)
+
+    def _number_columns(self, img_width, img_height):
+        """Top-left corners of the left and right vertical number columns"""
+        y = int((img_height - NUMBER_COLUMN_HEIGHT) // 2.7)
+        return [(TEXT_PADDING, y), (img_width - TEXT_PADDING - FONT_SIZE, y)]
+
+    def number_origins(self, img_width, img_height):
+        """Bottom-left corners of both number columns, where the text starts"""
+        return [
+            (x, y + NUMBER_COLUMN_HEIGHT)
+            for x, y in self._number_columns(img_width, img_height)
+        ]
+
+    def _vertical_text_slots(self, img_width, img_height, start, length):
+        """Top-left corners of a run of vertical text in both number columns.
+
+        Both arguments are pixel distances along the number line: where the
+        run begins, and how long it is.
+        """
+        # Text reads bottom to top, so an offset along the line moves it up
+        return [
+            (x, y + NUMBER_COLUMN_HEIGHT - start - length)
+            for x, y in self._number_columns(img_width, img_height)
+        ]
+
+    def _paste_vertical_text(self, img, text, start):
+        """Blend text into both number columns, start pixels along the text line"""
+        img_height, img_width = img.shape[:2]
+        rotated = self._create_vertical_text(text, TEXT_COLOR)
+        for x, y in self._vertical_text_slots(img_width, img_height, start, rotated.shape[0]):
+            blend_overlay(img, rotated, x, y)
+
+    def create_base_template(self, template):
+        """Return the template with the border and number prefixes as an RGBA array"""
+        img = template.convert("RGBA")
         img_width, img_height = img.size
 
-        # Add border
         draw = ImageDraw.Draw(img)
         draw.rectangle(
             [(0, 0), (img_width - 1, img_height - 1)], outline="lightgray", width=2
         )
+        img = np.array(img)
+        self._paste_vertical_text(img, NUMBER_PREFIX, 0)
 
-        formatted_number = f"NO: {ticket_number:06d}"
-
-        # Left number
-        left_text = self._create_vertical_text(
-            formatted_number, img_height, img_width, TEXT_COLOR
-        )
-        left_x = TEXT_PADDING
-        left_y = int((img_height - left_text.size[1]) // 2.7)
-        img.paste(left_text, (left_x, left_y), left_text)
-
-        # Right number - mirror position of left number
-        right_text = self._create_vertical_text(
-            formatted_number, img_height, img_width, TEXT_COLOR
-        )
-        right_x = img_width - TEXT_PADDING - right_text.size[0]
-        right_y = left_y  # Use same vertical position as left text
-        img.paste(right_text, (right_x, right_y), right_text)
+        return img
 
+    def add_numbers_to_patches(self, ticket_number, base):
+        """Return (x, y, patch) pieces of base carrying the ticket number.
+
+        Drawing the patches over base at (x, y) gives the complete ticket.
+        The patch arrays are reused, so they are only valid until the next call.
+        """
+        img_height, img_width = base.shape[:2]
+        rotated = self._create_vertical_number(ticket_number)
+        h, w = rotated.shape[:2]
+        prefix_width = self._get_glyph(NUMBER_PREFIX, TEXT_COLOR).shape[0]
+
+        patches = []
+        slots = self._vertical_text_slots(img_width, img_height, prefix_width, h)
+        for i, (x, y) in enumerate(slots):
+            patch = self._scratch(("patch", i), (h, w, 4))
+            np.copyto(patch, base[y : y + h, x : x + w])
+            blend_overlay(patch, rotated, 0, 0)
+            patches.append((x, y, patch))
+        return patches
+
+    def _base_palette(self, base):
+        """Return (colors, indices): an adaptive palette for base as an (n, 3)
+        array and base's pixels as indices into it, built once per base"""
+        if self._palette_base is not base:
+            # The flat-colour design survives a small palette, a third of the size
+            rgb = np.ascontiguousarray(base[..., :3])
+            img = Image.fromarray(rgb).convert(
+                "P", palette=Image.Palette.ADAPTIVE, colors=TICKET_PNG_COLORS
+            )
+            colors = np.array(img.getpalette(), np.uint8).reshape(-1, 3)
+
+            # Median cut gives each entry the mean of its colours, which tints
+            # the template's flat areas (white came out as (249, 251, 254)).
+            # Use the colour each entry covers most instead, so those stay exact
+            keys, counts = np.unique(
+                np.array(img).astype(np.uint32) << 24 | pack_rgb(rgb), return_counts=True
+            )
+            keys = keys[np.argsort(counts, kind="stable")]  # Most common last wins
+            colors[keys >> 24] = np.stack([keys >> 16, keys >> 8, keys], axis=-1) & 0xFF
+
+            self._palette = (colors, palette_indices(rgb, colors))
+            self._palette_base = base
+        return self._palette
+
+    def save_ticket(self, ticket_number, base, patches, output_folder):
+        """Save base with the ticket's number patches drawn over it as a PNG"""
+        # Only the digits differ from base, so base's palette fits every ticket
+        # and only the patches need mapping to it
+        colors, indices = self._base_palette(base)
+        img = indices.copy()
+        for x, y, patch in patches:
+            h, w = patch.shape[:2]
+            img[y : y + h, x : x + w] = palette_indices(patch, colors)
+
+        img = Image.fromarray(img)
+        img.putpalette(colors.tobytes())
         output_path = os.path.join(output_folder, f"ticket_{ticket_number:06d}.png")
         img.save(output_path)
         return output_path
 
-    def add_numbers_to_ticket_memory(self, ticket_number, template):
-        """Generate ticket in memory without saving to disk"""
-        img = template.copy()
-        img_width, img_height = img.size
 
-        draw = ImageDraw.Draw(img)
-        draw.rectangle(
-            [(0, 0), (img_width - 1, img_height - 1)], outline="lightgray", width=2
-        )
+# Per-process rendering state, set once by _init_render_worker
+_worker_generator = None
+_worker_image_folder = None
 
-        formatted_number = f"NO: {ticket_number:06d}"
 
-        left_text = self._create_vertical_text(
-            formatted_number, img_height, img_width, TEXT_COLOR
-        )
-        left_x = TEXT_PADDING
-        left_y = int((img_height - left_text.size[1]) // 2.7)
-        img.paste(left_text, (left_x, left_y), left_text)
+def _init_render_worker(template_path, image_folder):
+    # Each worker loads its own generator, so only the paths are sent to it
+    global _worker_generator, _worker_image_folder
+    _worker_generator = TicketGenerator(template_path)
+    _worker_image_folder = image_folder
 
-        right_text = self._create_vertical_text(
-            formatted_number, img_height, img_width, TEXT_COLOR
-        )
-        right_x = img_width - TEXT_PADDING - right_text.size[0]
-        right_y = left_y
-        img.paste(right_text, (right_x, right_y), right_text)
 
-        return img
+def _save_ticket_image(ticket_number):
+    """Render one ticket in a worker process and save it as an individual image"""
+    return _worker_generator.add_numbers_to_ticket(ticket_number, _worker_image_folder)
 
 
 class PDFGenerator:
@@ -114,21 +282,68 @@ class PDFGenerator:
         self.tickets_per_page = 8  # 2x4 layout
         self.dpi = 150  # Reduced DPI for smaller file size
 
+    def _register_font(self, font_path):
+        """Register a TrueType font file with reportlab and return its name"""
+        font_name = os.path.splitext(os.path.basename(font_path))[0]
+        pdfmetrics.registerFont(TTFont(font_name, font_path))
+        return font_name
+
+    def _draw_vertical_text(self, c, text, origins, start):
+        """Draw text reading bottom to top from each origin, start units along"""
+        for x, y in origins:
+            c.saveState()
+            c.translate(x, y + start)
+            c.rotate(90)
+            c.drawString(0, 0, text)
+            c.restoreState()
+
+    def _draw_tickets(self, c, tickets, scale_x, scale_y, font_name, origins, digits_start):
+        """Draw (x, y, ticket_number) tickets as the template form plus the number"""
+        c.setFont(font_name, FONT_SIZE)
+        c.setFillColor(HexColor(TEXT_COLOR))
+        for x, y, ticket_number in tickets:
+            # Draw in template pixel units
+            c.saveState()
+            c.translate(x, y)
+            c.scale(scale_x, scale_y)
+            c.doForm("template")
+            self._draw_vertical_text(
+                c, f"{ticket_number:0{NUMBER_DIGITS}d}", origins, digits_start
+            )
+            c.restoreState()
+
+    def _start_ticket_images(self, ticket_generator, start_number, num_tickets):
+        """Start rendering individual ticket images in worker processes;
+        returns the pool and an iterator over the saved paths"""
+        executor = ProcessPoolExecutor(
+            initializer=_init_render_worker,
+            initargs=(ticket_generator.template_path, "generated_tickets"),
+        )
+        # map submits every ticket up front, so workers start immediately
+        saved = executor.map(
+            _save_ticket_image,
+            range(start_number, start_number + num_tickets),
+            chunksize=RENDER_CHUNKSIZE,
+        )
+        return executor, saved
+
     def create_pdf(self, ticket_generator, start_number, num_tickets, generate_images=False):
         pdf_path = os.path.join("output_pdf", "raffle_tickets.pdf")
-        c = canvas.Canvas(pdf_path, pagesize=(self.page_width, self.page_height))
-        
+        # Pages hold a few operators per ticket, so skip the zlib pass over them
+        c = canvas.Canvas(
+            pdf_path, pagesize=(self.page_width, self.page_height), pageCompression=0
+        )
 
         # Calculate dimensions once
         usable_width = self.page_width - (2 * MARGIN)
         usable_height = self.page_height - (2 * MARGIN)
 
-        with Image.open(ticket_generator.template_path) as img:
-            template_ratio = img.size[0] / img.size[1]
-            # Resize template to optimal size
-            optimal_width = int(1000 * template_ratio)
-            optimal_height = 1000
-            img = img.resize((optimal_width, optimal_height), Image.Resampling.LANCZOS)
+        img = ticket_generator.template
+        template_ratio = img.size[0] / img.size[1]
+        # Tickets are laid out on the template scaled to 1000 units high; the
+        # number font, padding and border sizes are all tuned for that
+        template_height = 1000
+        template_width = int(template_height * template_ratio)
 
         ticket_width = (usable_width - SPACING) / 2
         ticket_height = (usable_height - SPACING) / 2
@@ -138,42 +353,94 @@ class PDFGenerator:
         else:
             ticket_height = ticket_width / template_ratio
 
-        total_pages = math.ceil(num_tickets / self.tickets_per_page)
+        # Embed the template at exactly its printed pixel size for self.dpi, so it
+        # is resampled once here and not again by the PDF viewer. Bilinear is a
+        # fraction of Lanczos' cost; the aspect ratio is kept either way
+        pdf_height = int(ticket_height * self.dpi / 72)
+        pdf_width = int(pdf_height * template_ratio)
+        pdf_template = img.resize((pdf_width, pdf_height), Image.Resampling.BILINEAR)
 
-        print(f"\nGenerating PDF with {total_pages} pages...")
-        start_time = time.time()
+        # Scale from template layout units to ticket size on the page
+        scale_x = ticket_width / template_width
+        scale_y = ticket_height / template_height
 
-        for i in range(num_tickets):
-            if i % 10 == 0:
-                progress = (i / num_tickets) * 100
-                print(f"Progress: {progress:.1f}%")
+        # Numbers use the same font file as the individual ticket images
+        font_name = self._register_font(ticket_generator.font_path)
 
-            ticket_number = start_number + i
+        # Number baselines in the form's y-up pixel space; glyph tops face left
+        ascent = pdfmetrics.getAscent(font_name, FONT_SIZE)
+        origins = [
+            (x + ascent, template_height - y)
+            for x, y in ticket_generator.number_origins(template_width, template_height)
+        ]
+        digits_start = pdfmetrics.stringWidth(NUMBER_PREFIX, font_name, FONT_SIZE)
 
-            # Save individual images if requested
-            if generate_images:
-                ticket_generator.add_numbers_to_ticket(ticket_number, "generated_tickets")
-            
-            # Generate ticket for PDF
-            img_buffer = io.BytesIO()
-            ticket_img = ticket_generator.add_numbers_to_ticket_memory(ticket_number, img)
-            ticket_img.save(img_buffer, format="PNG", optimize=True)
-            img_buffer.seek(0)
-
-            page_position = i % self.tickets_per_page
-            row = page_position // 2
-            col = page_position % 2
-
-            if page_position == 0 and i != 0:
-                c.showPage()
+        total_pages = math.ceil(num_tickets / self.tickets_per_page)
 
-            x = MARGIN + col * (ticket_width + SPACING)
-            y = self.page_height - MARGIN - (row + 1) * ticket_height - row * SPACING
+        print(f"\nGenerating PDF with {total_pages} pages...")
+        start_time = time.time()
 
-            c.drawImage(ImageReader(img_buffer), x, y, ticket_width, ticket_height)
+        # Template, border and "NO: " prefixes are embedded once as a form;
+        # each ticket places the form and draws its digits as vector text
+        c.beginForm("template", 0, 0, template_width, template_height)
+        c.drawImage(
+            ImageReader(io.BytesIO(encode_jpeg(pdf_template))),
+            0,
+            0,
+            template_width,
+            template_height,
+        )
+        c.setStrokeColor(BORDER_COLOR)
+        c.setLineWidth(2)
+        c.rect(1, 1, template_width - 2, template_height - 2)
+        c.setFont(font_name, FONT_SIZE)
+        c.setFillColor(HexColor(TEXT_COLOR))
+        self._draw_vertical_text(c, NUMBER_PREFIX, origins, 0)
+        c.endForm()
+
+        image_pool = None
+        if generate_images:
+            # Individual images are rendered at the template's own size, in
+            # worker processes that run while the main process draws the PDF
+            image_pool, saved_images = self._start_ticket_images(
+                ticket_generator, start_number, num_tickets
+            )
 
-        c.save()
-        print(f"\nPDF generation completed in {time.time() - start_time:.1f} seconds")
+        try:
+            # Tickets are queued per page and drawn together before each page break
+            page_tickets = []
+
+            for i in tqdm(range(num_tickets), desc="Progress", unit="ticket"):
+                page_position = i % self.tickets_per_page
+                row = page_position // 2
+                col = page_position % 2
+
+                if page_position == 0 and i != 0:
+                    self._draw_tickets(
+                        c, page_tickets, scale_x, scale_y, font_name, origins, digits_start
+                    )
+                    page_tickets.clear()
+                    c.showPage()
+
+                x = MARGIN + col * (ticket_width + SPACING)
+                y = self.page_height - MARGIN - (row + 1) * ticket_height - row * SPACING
+                page_tickets.append((x, y, start_number + i))
+
+            self._draw_tickets(
+                c, page_tickets, scale_x, scale_y, font_name, origins, digits_start
+            )
+            c.save()
+            print(f"\nPDF generation completed in {time.time() - start_time:.1f} seconds")
+
+            if image_pool is not None:
+                for _ in tqdm(saved_images, total=num_tickets, desc="Images", unit="ticket"):
+                    pass
+                image_pool.shutdown()
+        except BaseException:
+            if image_pool is not None:
+                # Don't wait on queued images when the run has already failed
+                image_pool.shutdown(cancel_futures=True)
+            raise
 
 
 def create_folders():
@@ -243,4 +510,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Worker processes in the PyInstaller build
     main()
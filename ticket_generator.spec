@@ -1,9 +1,16 @@
+import os
+import reportlab
+
 block_cipher = None
 
 a = Analysis(['ticket_generator.py'],
     pathex=[],
     binaries=[],
-    datas=[('Humana Raffle Ticket Template.png', '.')],
+    datas=[
+        ('Humana Raffle Ticket Template.png', '.'),
+        # Fallback ticket number font where Arial is not installed
+        (os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'VeraBd.ttf'), 'reportlab/fonts'),
+    ],
     hiddenimports=[],
     hookspath=[],
     runtime_hooks=[],